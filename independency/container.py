@@ -1,15 +1,20 @@
-import copy
 import dataclasses
+import functools
 import inspect
 from enum import Enum
+from types import MappingProxyType
 from typing import (
     Any,
     Callable,
     Dict,
     ForwardRef,
+    FrozenSet,
+    Iterator,
     List,
+    Mapping,
     Optional,
     Set,
+    Tuple,
     Type,
     TypeVar,
     Union,
@@ -22,6 +27,11 @@ from typing import (
 
 _T = TypeVar('_T', bound=Any)
 ObjType = Union[Type[_T], str]
+KeyType = Union[Type[_T], str, ForwardRef]
+
+DependencyGraph = Dict[ObjType[Any], Dict[str, ObjType[Any]]]
+
+_MISSING = object()
 
 
 class Scope(Enum):
@@ -34,39 +44,68 @@ class ContainerError(Exception):
     pass
 
 
-@dataclasses.dataclass
+# frozen slotted instances can not restore their state with setattr, which copy and pickle do by default
+def _slots_getstate(self: Any) -> Tuple[Any, ...]:
+    return tuple(getattr(self, name) for name in self.__slots__)
+
+
+def _slots_setstate(self: Any, state: Tuple[Any, ...]) -> None:
+    for name, value in zip(self.__slots__, state):
+        object.__setattr__(self, name, value)
+
+
+@dataclasses.dataclass(frozen=True)
 class Registration:
+    __slots__ = ('cls', 'factory', 'scope', 'kwargs', 'constants', 'dep_kwargs', 'bound_factory', 'deps')
+
     cls: ObjType[Any]
     factory: Callable[..., Any]
     scope: Scope
     kwargs: Dict[str, Any]
+    constants: Dict[str, Any]
+    dep_kwargs: Dict[str, ObjType[Any]]
+    bound_factory: Callable[..., Any]
+    deps: Dict[str, ObjType[Any]]
 
+    __getstate__ = _slots_getstate
+    __setstate__ = _slots_setstate
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(frozen=True)
 class Dependency:
+    __slots__ = ('cls',)
+
     cls: ObjType[Any]
 
+    __getstate__ = _slots_getstate
+    __setstate__ = _slots_setstate
+
+
+# only ever called with annotation types: caching factories would keep their closures alive
+_get_origin: Callable[[Any], Any] = functools.lru_cache(maxsize=1024)(get_origin)
+_get_args: Callable[[Any], Tuple[Any, ...]] = functools.lru_cache(maxsize=1024)(get_args)
+
 
 def get_generic_mapping(cls: Any) -> Dict[TypeVar, Type[_T]]:
-    origin = get_origin(cls)
+    origin = _get_origin(cls)
     if origin is None:
         return {}
-    return dict(zip(origin.__parameters__, get_args(cls)))
+    return dict(zip(origin.__parameters__, _get_args(cls)))
 
 
 def resolve(t: Type[_T], mapping: Dict[Any, Type[Any]]) -> Type[_T]:
     if t in mapping:
         return cast(Type[_T], mapping[t])
-    if get_origin(t) is None:
+    origin = _get_origin(t)
+    if origin is None:
         return t
-    resolved_args = [resolve(arg, mapping) for arg in get_args(t)]
-    return get_origin(t)[tuple(resolved_args)]  # type: ignore
+    resolved_args = [resolve(arg, mapping) for arg in _get_args(t)]
+    return origin[tuple(resolved_args)]  # type: ignore
 
 
-def get_signature(f: Callable[..., Any], localns: Dict[str, Any]) -> Dict[str, Type[Any]]:
-    if get_origin(f) is not None:
-        cls = get_origin(f)
-        signature = get_signature(cls.__init__, localns=localns)  # type: ignore
+def get_signature(f: Callable[..., Any], localns: Mapping[str, Any]) -> Dict[str, Type[Any]]:
+    if (cls := get_origin(f)) is not None:
+        signature = get_signature(cls.__init__, localns=localns)
         mapping = get_generic_mapping(f)  # type: ignore
         for key, value in signature.items():
             signature[key] = resolve(value, mapping)
@@ -79,9 +118,8 @@ def get_signature(f: Callable[..., Any], localns: Dict[str, Any]) -> Dict[str, T
 
 
 def get_arg_names(f: Callable[..., Any]) -> List[str]:
-    if get_origin(f) is not None:
-        cls = get_origin(f)
-        return get_arg_names(cls.__init__)  # type: ignore
+    if (cls := get_origin(f)) is not None:
+        return get_arg_names(cls.__init__)
     if isinstance(f, type):
         return get_arg_names(f.__init__)  # type: ignore
     if not callable(f):
@@ -92,7 +130,7 @@ def get_arg_names(f: Callable[..., Any]) -> List[str]:
         raise ContainerError(f'Unsupported callable {type(f)}') from e
 
 
-def get_from_localns(cls: ObjType[Any], localns: Dict[str, Any]) -> Any:
+def get_from_localns(cls: KeyType[Any], localns: Mapping[str, Any]) -> Any:
     if isinstance(cls, type):
         return localns.get(cls.__name__, cls)
     if isinstance(cls, ForwardRef):
@@ -100,22 +138,164 @@ def get_from_localns(cls: ObjType[Any], localns: Dict[str, Any]) -> Any:
     return localns.get(cls, cls)
 
 
-def get_deps(reg: Registration, localns: Dict[str, Any]) -> Dict[str, ObjType[Any]]:
+def _canonical_key(cls: KeyType[_T]) -> ObjType[_T]:
+    if isinstance(cls, ForwardRef):
+        return cls.__forward_arg__
+    return cls
+
+
+def get_deps(reg: Registration, localns: Mapping[str, Any]) -> Dict[str, ObjType[Any]]:
     result: Dict[str, ObjType[Any]] = {
         name: value for name, value in get_signature(reg.factory, localns).items() if name not in reg.kwargs
     }
-    for key, value in reg.kwargs.items():
-        if isinstance(value, Dependency):
-            result[key] = value.cls
+    result.update(reg.dep_kwargs)
     return result
 
 
-def _resolve_constants(kwargs: Dict[str, Any]) -> Dict[str, Any]:
-    result = {}
+def _create_registration(
+    cls: ObjType[Any], factory: Callable[..., Any], scope: Scope, kwargs: Dict[str, Any]
+) -> Registration:
+    constants = {}
+    dep_kwargs = {}
     for key, value in kwargs.items():
-        if not isinstance(value, Dependency):
-            result[key] = value
-    return result
+        if isinstance(value, Dependency):
+            dep_kwargs[key] = value.cls
+        else:
+            constants[key] = value
+    return Registration(
+        cls=cls,
+        factory=factory,
+        scope=scope,
+        kwargs=kwargs,
+        constants=constants,
+        dep_kwargs=dep_kwargs,
+        bound_factory=functools.partial(factory, **constants) if constants else factory,
+        deps={},
+    )
+
+
+def _link_registration(reg: Registration, localns: Mapping[str, Any]) -> Registration:
+    return dataclasses.replace(reg, deps=get_deps(reg, localns))
+
+
+def _link_registry(
+    registry: Dict[ObjType[Any], Registration], localns: Mapping[str, Any]
+) -> Dict[ObjType[Any], Registration]:
+    return {cls: _link_registration(reg, localns) for cls, reg in registry.items()}
+
+
+def _missing_resolver(cls: ObjType[Any]) -> Callable[..., Any]:
+    def resolver(*args: Any) -> Any:
+        raise ContainerError(f"No dependency of type {cls}")
+
+    return resolver
+
+
+# lookup and store statements for instances shared between resolutions, singletons live in one-item cells
+_SCOPE_STORAGE = {
+    Scope.singleton: ('_cell_{index}[0]', '_cell_{index}[0] = {value}'),
+    Scope.cached: ('_cache.get(_cls_{index}, _MISSING)', '_cache[_cls_{index}] = {value}'),
+}
+
+
+def _resolve_edges(
+    reg: Registration, registry: Dict[ObjType[Any], Registration], localns: Mapping[str, Any]
+) -> Dict[str, ObjType[Any]]:
+    return {arg: dep if dep in registry else get_from_localns(dep, localns) for arg, dep in reg.deps.items()}
+
+
+def _build_graph(registry: Dict[ObjType[Any], Registration], localns: Mapping[str, Any]) -> DependencyGraph:
+    return {cls: _resolve_edges(reg, registry, localns) for cls, reg in registry.items()}
+
+
+@dataclasses.dataclass
+class _Step:
+    __slots__ = ('lookup', 'build', 'deps')
+
+    # returns the stored instance or _MISSING, None for transient registrations which are never stored
+    lookup: Optional[Callable[[Dict[ObjType[Any], Any]], Any]]
+    # calls the factory with the resolved dependencies in ``deps`` order and stores the instance
+    build: Callable[..., Any]
+    deps: List['_Step']
+
+
+def _run(step: _Step, cache: Dict[ObjType[Any], Any]) -> Any:
+    if step.lookup is not None and (value := step.lookup(cache)) is not _MISSING:
+        return value
+    # an explicit stack of steps with the values of their dependencies resolved so far, so the depth of
+    # the dependency graph is not limited by the Python recursion limit
+    stack: List[Tuple[_Step, Iterator[_Step], List[Any]]] = [(step, iter(step.deps), [])]
+    while True:
+        step, deps, values = stack[-1]
+        for dep in deps:
+            if dep.lookup is None or (value := dep.lookup(cache)) is _MISSING:
+                if dep.deps:
+                    stack.append((dep, iter(dep.deps), []))
+                    break
+                value = dep.build(cache, ())
+            values.append(value)
+        else:
+            value = step.build(cache, values)
+            stack.pop()
+            if not stack:
+                return value
+            stack[-1][2].append(value)
+
+
+# Steps are generated on first use, together with the not yet compiled steps they depend on. Their generated
+# functions never call each other, dependencies are resolved by _run.
+class _ResolverCompiler:  # pylint: disable=R0903
+    __slots__ = ["_registry", "_graph", "_indices", "_steps", "_namespace"]
+
+    def __init__(self, registry: Dict[ObjType[Any], Registration], graph: DependencyGraph):
+        self._registry = registry
+        self._graph = graph
+        self._indices: Dict[ObjType[Any], int] = {}
+        self._steps: Dict[ObjType[Any], _Step] = {}
+        # every container compiles into its own namespace, so singleton cells are not shared between containers
+        self._namespace: Dict[str, Any] = {'_MISSING': _MISSING}
+
+    def compile(self, cls: ObjType[Any]) -> _Step:
+        created = []
+        pending = [cls]
+        while pending:
+            current = pending.pop()
+            if current in self._indices:
+                continue
+            index = self._indices[current] = len(self._indices)
+            if current in self._registry:
+                created.append((current, index))
+                pending.extend(self._graph[current].values())
+            else:
+                missing = _missing_resolver(current)
+                self._steps[current] = _Step(lookup=missing, build=missing, deps=[])
+        if created:
+            source = '\n\n'.join(self._generate(current, index) for current, index in created)
+            exec(compile(source, '<independency>', 'exec'), self._namespace)  # pylint: disable=W0122
+        for current, index in created:
+            self._steps[current] = _Step(
+                lookup=self._namespace.get(f'_lookup_{index}'), build=self._namespace[f'_build_{index}'], deps=[]
+            )
+        for current, _ in created:
+            self._steps[current].deps = [self._steps[dep] for dep in self._graph[current].values()]
+        return self._steps[cls]
+
+    def _generate(self, cls: ObjType[Any], index: int) -> str:
+        reg = self._registry[cls]
+        self._namespace[f'_cls_{index}'] = cls
+        self._namespace[f'_factory_{index}'] = reg.bound_factory
+        if reg.scope is Scope.singleton:
+            self._namespace[f'_cell_{index}'] = [_MISSING]
+        args = ', '.join(f'{arg}=values[{position}]' for position, arg in enumerate(self._graph[cls]))
+        storage = _SCOPE_STORAGE.get(reg.scope)
+        lines = []
+        if storage is not None:
+            lines += [f'def _lookup_{index}(_cache):', f'    return {storage[0].format(index=index)}', '']
+        lines += [f'def _build_{index}(_cache, values):', f'    value = _factory_{index}({args})']
+        if storage is not None:
+            lines.append(f'    {storage[1].format(index=index, value="value")}')
+        lines.append('    return value')
+        return '\n'.join(lines)
 
 
 def _validate_registration(cls: ObjType[Any], factory: Callable[..., Any], kwargs: Dict[str, Any]) -> None:
@@ -134,117 +314,104 @@ def _update_localns(cls: ObjType[Any], localns: Dict[str, Any]) -> None:
         localns[cls] = cls
 
 
-class ResolutionCache:
-    def __init__(self) -> None:
-        self.cache: Dict[ObjType[Any], Any] = {}
-
-    def __setitem__(self, key: ObjType[Any], instance: Any) -> None:
-        self.cache[key] = instance
-
-    def __getitem__(self, key: Union[Type[Any], str]) -> Any:
-        cls_ = self.cache.get(key)
-        assert cls_ is not None
-        return cls_
-
-    def has_cached(self, key: Union[Type[Any], str]) -> bool:
-        return key in self.cache
-
-    def clear(self) -> None:
-        self.cache.clear()
-
-
 class Container:  # pylint: disable=R0903
-    __slots__ = ["_registry", "_localns", "_resolved", "_cache"]
+    __slots__ = ["_registry", "_registered", "_localns", "_graph", "_cache", "_compiler", "_steps"]
 
     def __init__(
         self,
         registry: Dict[ObjType[Any], Registration],
-        localns: Dict[str, Any],
+        localns: Mapping[str, Any],
+        graph: Optional[DependencyGraph] = None,
     ):
         self._registry = registry
+        self._registered = frozenset(registry)
         self._localns = localns
-        self._resolved: Dict[Union[Type[Any], str], Any] = {}
-        self._cache = ResolutionCache()
+        self._graph = _build_graph(registry, localns) if graph is None else graph
+        self._cache: Dict[ObjType[Any], Any] = {}
+        self._compiler = _ResolverCompiler(registry, self._graph)
+        self._steps: Dict[KeyType[Any], _Step] = {}
 
-    def get_registered_deps(self) -> Set[ObjType[Any]]:
-        return set(self._registry.keys())
+    def get_registered_deps(self) -> FrozenSet[ObjType[Any]]:
+        return self._registered
 
-    def resolve(self, cls: Union[Type[_T], str]) -> _T:
+    def resolve(self, cls: KeyType[_T]) -> _T:
         result: _T = self._resolve_impl(cls)
         self._cache.clear()
         return result
 
-    def _resolve_impl(self, cls: Union[Type[_T], str]) -> Any:
-        cls = get_from_localns(cls, self._localns)
-
-        if cls in self._resolved:
-            return self._resolved[cls]
-
-        if self._cache.has_cached(cls):
-            return self._cache[cls]
-
-        try:
-            current = self._registry[cls]
-        except KeyError as e:
-            raise ContainerError(f"No dependency of type {cls}") from e
-
-        args = _resolve_constants(current.kwargs)
-        deps_to_resolve = get_deps(current, self._localns)
-        for key, d in deps_to_resolve.items():
-            args[key] = self._resolve_impl(d)
-        result: _T = current.factory(**args)
-        if current.scope is Scope.singleton:
-            self._resolved[current.cls] = result
-        if current.scope is Scope.cached:
-            self._cache[cls] = result
-        return result  # noqa: R504
+    def _resolve_impl(self, cls: KeyType[_T]) -> Any:
+        step = self._steps.get(cls)
+        if step is None:
+            key = cls if cls in self._registry else get_from_localns(cls, self._localns)
+            if key not in self._registry:
+                raise ContainerError(f"No dependency of type {key}")
+            # localns is fixed once the container exists, so every key is compiled and aliased only once
+            step = self._steps[cls] = self._compiler.compile(key)
+        return _run(step, self._cache)
 
     def create_test_container(self) -> "TestContainer":
-        registry = copy.deepcopy(self._registry)
-        localns = copy.deepcopy(self._localns)
-        test_container = TestContainer(registry=registry, localns=localns)
-        registry[Container] = Registration(
-            Container,
-            factory=lambda: test_container,
-            scope=Scope.singleton,
-            kwargs={},
+        registry = self._registry.copy()
+        localns = dict(self._localns)
+        registry[Container] = _link_registration(
+            _create_registration(
+                Container,
+                factory=lambda: test_container,
+                scope=Scope.singleton,
+                kwargs={},
+            ),
+            localns,
         )
         _update_localns(Container, localns)
+        test_container = TestContainer(registry=registry, localns=MappingProxyType(localns), graph=self._graph)
         return test_container
 
 
 class TestContainer(Container):
+    __slots__ = ()
+
     def with_overridden(
         self,
-        cls: Union[Type[_T], str],
+        cls: KeyType[_T],
         factory: Callable[..., Any],
         scope: Scope = Scope.transient,
         **kwargs: Any,
     ) -> "TestContainer":
+        cls = _canonical_key(cls)
         if cls not in self._registry:
             raise ContainerError(
                 "Can not override class without any registration"
             )
         _validate_registration(cls, factory, kwargs)
-        registry = copy.deepcopy(self._registry)
-        localns = copy.deepcopy(self._localns)
+        registry = self._registry.copy()
+        localns = dict(self._localns)
         _update_localns(cls, localns)
-        registry[cls] = Registration(
-            cls=cls, factory=factory, kwargs=kwargs, scope=scope
+        registry[cls] = _link_registration(
+            _create_registration(cls=cls, factory=factory, kwargs=kwargs, scope=scope),
+            localns,
         )
-        container = TestContainer(registry, localns)
-        registry[Container] = Registration(
-            Container,
-            factory=lambda: container,
-            scope=Scope.singleton,
-            kwargs={},
+        registry[Container] = _link_registration(
+            _create_registration(
+                Container,
+                factory=lambda: container,
+                scope=Scope.singleton,
+                kwargs={},
+            ),
+            localns,
         )
         _update_localns(Container, localns)
+        if localns == self._localns:
+            graph = self._graph.copy()
+            graph[cls] = _resolve_edges(registry[cls], registry, localns)
+        else:
+            # the override rebinds a name, so annotations of every registration are evaluated again
+            registry = _link_registry(registry, localns)
+            graph = _build_graph(registry, localns)
+        container = TestContainer(registry, MappingProxyType(localns), graph)
         return container
 
     def with_overridden_singleton(
         self,
-        cls: Union[Type[_T], str],
+        cls: KeyType[_T],
         factory: Callable[..., Any],
         **kwargs: Any,
     ) -> "TestContainer":
@@ -262,20 +429,24 @@ class ContainerBuilder:
 
     def build(self) -> Container:
         registry = self._registry.copy()
-        localns = self._localns.copy()
-        container = Container(registry=registry, localns=localns)
-        registry[Container] = Registration(
+        localns = dict(self._localns)
+        registry[Container] = _create_registration(
             cls=Container,
             factory=lambda: container,
             kwargs={},
             scope=Scope.singleton,
         )
         _update_localns(Container, localns)
-        self._check_resolvable(registry, localns)
+        # annotations are evaluated against this namespace only while building, never on resolve
+        frozen_localns = MappingProxyType(localns)
+        registry = _link_registry(registry, frozen_localns)
+        graph = _build_graph(registry, frozen_localns)
+        self._check_resolvable(graph)
+        container = Container(registry=registry, localns=frozen_localns, graph=graph)
         return container
 
     def singleton(
-        self, cls: ObjType[Any], factory: Callable[..., Any], **kwargs: Any
+        self, cls: KeyType[Any], factory: Callable[..., Any], **kwargs: Any
     ) -> None:
         self.register(
             cls=cls, factory=factory, scope=Scope.singleton, **kwargs
@@ -283,49 +454,48 @@ class ContainerBuilder:
 
     def register(
         self,
-        cls: ObjType[Any],
+        cls: KeyType[Any],
         factory: Callable[..., Any],
         scope: Scope = Scope.transient,
         **kwargs: Any,
     ) -> None:
+        cls = _canonical_key(cls)
         if cls in self._registry:
             raise ContainerError(f"Type {cls} is already registered")
         _validate_registration(cls, factory, kwargs)
-        self._registry[cls] = Registration(
+        self._registry[cls] = _create_registration(
             cls=cls, factory=factory, kwargs=kwargs, scope=scope
         )
         _update_localns(cls, self._localns)
 
-    def _check_resolvable(self, registry: Dict[ObjType[Any], Registration], localns: Dict[str, Any]) -> None:
+    def _check_resolvable(self, graph: DependencyGraph) -> None:
         resolved: Set[ObjType[Any]] = set()
-        for cls in registry:
-            self._check_resolution(cls, resolved, set(), registry=registry, localns=localns, parent=None)
+        for cls in graph:
+            self._check_resolution(cls, resolved, graph=graph)
 
     def _check_resolution(
         self,
         cls: ObjType[Any],
         resolved: Set[ObjType[Any]],
-        resolving: Set[ObjType[Any]],
-        registry: Dict[ObjType[Any], Registration],
-        localns: Dict[str, Any],
-        parent: Optional[ObjType[Any]],
+        graph: DependencyGraph,
     ) -> None:
-        cls = get_from_localns(cls, localns)
         if cls in resolved:
             return
-        if cls in resolving:
-            raise ContainerError(f'Cycle dependencies for type {cls}')
-        resolving.add(cls)
-
-        try:
-            current = registry[cls]
-        except KeyError as e:
-            raise ContainerError(f'No dependency of type {cls} needed by {parent}') from e
-
-        deps_to_resolve = get_deps(current, localns=localns)
-        for value in deps_to_resolve.values():
-            self._check_resolution(
-                value, resolved=resolved, resolving=resolving, registry=registry, localns=localns, parent=cls
-            )
-        resolving.remove(cls)
-        resolved.add(cls)
+        resolving = {cls}
+        stack = [(cls, iter(graph[cls].values()))]
+        while stack:
+            parent, deps = stack[-1]
+            value = next(deps, _MISSING)
+            if value is _MISSING:
+                stack.pop()
+                resolving.remove(parent)
+                resolved.add(parent)
+                continue
+            if value in resolved:
+                continue
+            if value in resolving:
+                raise ContainerError(f'Cycle dependencies for type {value}')
+            if value not in graph:
+                raise ContainerError(f'No dependency of type {value} needed by {parent}')
+            resolving.add(value)
+            stack.append((value, iter(graph[value].values())))
@@ -1,6 +1,8 @@
 import abc
+import copy
+import pickle
 from functools import lru_cache
-from typing import Any, Dict, Final, Generic, TypeVar
+from typing import Any, Dict, Final, ForwardRef, Generic, TypeVar
 
 import pytest
 
@@ -544,3 +546,160 @@ def test_unsupported_callable_raise_exception():
     builder = ContainerBuilder()
     with pytest.raises(ContainerError):
         builder.singleton('a', fake_factory)
+
+
+def test_transient_dependencies_are_not_shared_within_resolution():
+    class A:
+        pass
+
+    class B:
+        def __init__(self, a: A):
+            self.a = a
+
+    class C:
+        def __init__(self, a: A, b: B):
+            self.a = a
+            self.b = b
+
+    builder = ContainerBuilder()
+    builder.register(A, A)
+    builder.register(B, B)
+    builder.register(C, C)
+    container = builder.build()
+
+    inst = container.resolve(C)
+    assert inst.a is not inst.b.a
+
+
+def test_cached_dependencies_are_shared_within_resolution():
+    class A:
+        pass
+
+    class B:
+        def __init__(self, a: A):
+            self.a = a
+
+    class C:
+        def __init__(self, a: A, b: B):
+            self.a = a
+            self.b = b
+
+    builder = ContainerBuilder()
+    builder.register(A, A, scope=Scope.cached)
+    builder.register(B, B)
+    builder.register(C, C)
+    container = builder.build()
+
+    inst = container.resolve(C)
+    assert inst.a is inst.b.a
+    assert container.resolve(C).a is not inst.a
+
+
+def test_registered_types_with_same_name_are_resolved_directly():
+    def make_type(value: int) -> type:
+        class A:
+            def __init__(self) -> None:
+                self.value = value
+
+        return A
+
+    first, second = make_type(1), make_type(2)
+    builder = ContainerBuilder()
+    builder.register(first, first)
+    builder.register(second, second)
+    container = builder.build()
+
+    assert container.resolve(first).value == 1
+    assert container.resolve(second).value == 2
+
+
+def test_check_deep_dependency_chain():
+    builder = ContainerBuilder()
+    builder.singleton('0', lambda: 0)
+    for i in range(1, 2000):
+        builder.singleton(str(i), lambda prev: prev + 1, prev=Dep(str(i - 1)))
+
+    container = builder.build()
+    assert container.resolve('1999') == 1999
+
+
+def test_forward_reference_keys_are_registered_by_name():
+    class Kek:
+        def __init__(self, kek: 'Lol'):
+            self.kek = kek
+
+    class Lol:
+        def __init__(self, x: int):
+            self.x = x
+
+    builder = ContainerBuilder()
+    builder.singleton(ForwardRef('Lol'), lambda: Lol(1))
+    builder.singleton(Kek, Kek)
+
+    container = builder.build()
+    assert container.resolve(Kek).kek.x == 1
+    assert container.resolve('Lol') is container.resolve(ForwardRef('Lol'))
+    assert 'Lol' in container.get_registered_deps()
+
+
+def test_resolve_deep_transient_chain():
+    builder = ContainerBuilder()
+    builder.register('0', lambda: 0)
+    for i in range(1, 2000):
+        builder.register(str(i), lambda prev: prev + 1, prev=Dep(str(i - 1)))
+
+    container = builder.build()
+    assert container.resolve('1999') == 1999
+
+
+def test_dependency_can_be_copied_and_pickled():
+    dep = Dep(int)
+
+    assert copy.copy(dep) == dep
+    assert copy.deepcopy(dep) == dep
+    assert pickle.loads(pickle.dumps(dep)) == dep
+    assert pickle.loads(pickle.dumps(Dep('name'))).cls == 'name'
+
+
+def test_override_rebinding_a_name_relinks_annotations():
+    def make_type() -> type:
+        class A:
+            pass
+
+        return A
+
+    first, second = make_type(), make_type()
+
+    class U:
+        def __init__(self, a: 'A'):  # type: ignore
+            self.a = a
+
+    builder = ContainerBuilder()
+    builder.register(first, first)
+    builder.register(second, second)
+    builder.register(U, U)
+    container = builder.build()
+    assert isinstance(container.resolve(U).a, second)
+
+    test_container = container.create_test_container().with_overridden(first, first)
+    assert isinstance(test_container.resolve(U).a, first)
+    assert isinstance(container.resolve(U).a, second)
+
+
+def test_override_with_unregistered_dependency_raises_on_resolve():
+    class A:
+        pass
+
+    class B:
+        pass
+
+    def make_a(b: B) -> A:
+        return A()
+
+    builder = ContainerBuilder()
+    builder.register(A, A)
+    container = builder.build()
+
+    test_container = container.create_test_container().with_overridden(A, make_a)
+    with pytest.raises(ContainerError, match='No dependency of type'):
+        test_container.resolve(A)